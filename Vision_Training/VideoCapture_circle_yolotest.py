@@ -2,9 +2,15 @@ import cv2
 from ultralytics import YOLO
 import serial
 import time
+from roi_inference import RoiInference, draw_detections
+
+# 是否只对传送带区域做固定尺寸推理（ROI 在 roi_inference.BELT_ROI 中配置）
+# 先用 roi_benchmark.py 确认 ROI 的精度后再打开
+USE_ROI_INFERENCE = False
 
 # 加载模型
 model = YOLO('best.pt')
+roi_inference = None  # 读到第一帧后按画面尺寸创建
 
 # 初始化串口通信
 serial_port = None
@@ -32,18 +38,26 @@ while True:
         break
 
     # YOLOv8 进行预测
-    results = model(frame)
+    if USE_ROI_INFERENCE:
+        if roi_inference is None:
+            roi_inference = RoiInference(model, frame.shape)
+            print(f"ROI: {roi_inference.roi}, 输入尺寸: {roi_inference.input_shape}")
+        # 检测框已映射回整帧坐标
+        detections = roi_inference(frame)
+        annotated_frame = draw_detections(frame, detections, model.names, roi_inference.roi)
+    else:
+        results = model(frame)
 
-    # 可视化检测结果
-    annotated_frame = results[0].plot()
+        # 可视化检测结果
+        annotated_frame = results[0].plot()
 
-    # 解析检测结果
-    detections = results[0].boxes.data
+        # 解析检测结果
+        detections = results[0].boxes.data.tolist()
     
     current_label = None  # 当前检测的标签，默认无标签
     if len(detections) > 0:  # 如果有检测到物体
         det = detections[0]  # 取第一个检测结果
-        x1, y1, x2, y2, conf, cls = det.tolist()
+        x1, y1, x2, y2, conf, cls = det
         current_label = model.names[int(cls)]
 
     # 判断是否需要发送指令（根据有效状态变化）
@@ -0,0 +1,476 @@
+import cv2
+import numpy as np
+import os
+import signal
+import sys
+import time
+import multiprocessing as mp
+from collections import deque
+from multiprocessing import shared_memory
+from multiprocessing.connection import wait
+
+# 推理服务器：多个采集进程写共享内存帧环，多个推理进程并行跑 YOLO，结果按顺序送回各自的分拣串口
+# 主进程和每个子进程之间各用一条独立的 Pipe 通信，子进程异常退出时不会留下被占用的共享锁
+MODEL_PATH = 'best.pt'
+USE_ROI_INFERENCE = False  # 使用 roi_inference 的固定 ROI 推理（先用 roi_benchmark.py 验证 BELT_ROI）
+FRAME_SHAPE = (480, 640, 3)  # 帧环中每一帧的尺寸 (高, 宽, 通道)
+SLOTS_PER_CAMERA = 4  # 每个摄像头的帧环槽位数
+NUM_WORKERS = max(1, (os.cpu_count() or 2) // 2)
+REPORT_INTERVAL = 5.0  # 吞吐量统计间隔（秒）
+RESULT_TIMEOUT = 5.0  # 等待缺失序号的最长时间（秒），超时后跳过
+MAX_WORKER_RESTARTS = 3  # 每个推理进程异常退出后最多重启次数
+MAX_IN_FLIGHT = 2  # 每个推理进程最多同时分配的帧数
+
+# 摄像头列表：(视频源, 串口)，串口为 None 时只打印结果
+CAMERAS = [
+    (0, 'COM13'),
+]
+
+# 压测：用测试集图片模拟摄像头
+BENCH_SOURCE = 'gnocchi_data/test/images'
+BENCH_CAMERAS = 2
+BENCH_SECONDS = 20.0
+
+class FrameRing:
+    """共享内存中的固定尺寸帧环"""
+
+    def __init__(self, shape, slots, name=None):
+        size = slots * int(np.prod(shape))
+        if name is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=size)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.frames = np.ndarray((slots, *shape), dtype=np.uint8, buffer=self.shm.buf)
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def close(self):
+        del self.frames
+        try:
+            self.shm.close()
+        except BufferError:
+            # 仍有视图引用共享内存（例如 ultralytics 保留的上一帧），进程退出时会自动释放
+            pass
+
+    def unlink(self):
+        self.shm.unlink()
+
+class CameraSource:
+    """摄像头，直接读入帧环槽位"""
+
+    def __init__(self, index, shape):
+        self.shape = shape
+        self.cap = cv2.VideoCapture(index)
+        self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, shape[1])
+        self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, shape[0])
+
+    def read_into(self, out):
+        ret, frame = self.cap.read(out)
+        if not ret:
+            return False
+        # 摄像头分辨率不一致时 OpenCV 会另外分配，缩放回槽位
+        if frame is not out:
+            cv2.resize(frame, (self.shape[1], self.shape[0]), dst=out)
+        return True
+
+    def skip(self):
+        self.cap.grab()
+
+    def release(self):
+        self.cap.release()
+
+class ImageFolderSource:
+    """循环回放图片文件夹，用于压测"""
+
+    def __init__(self, folder, shape):
+        self.images = []
+        for name in sorted(os.listdir(folder)):
+            image = cv2.imread(os.path.join(folder, name))
+            if image is not None:
+                self.images.append(cv2.resize(image, (shape[1], shape[0])))
+        if not self.images:
+            raise ValueError(f"{folder} 中没有图片")
+        self.index = 0
+
+    def read_into(self, out):
+        np.copyto(out, self.images[self.index])
+        self.index = (self.index + 1) % len(self.images)
+        return True
+
+    def skip(self):
+        pass
+
+    def release(self):
+        pass
+
+def open_source(source, shape):
+    if isinstance(source, int):
+        return CameraSource(source, shape)
+    return ImageFolderSource(source, shape)
+
+def capture_process(camera_id, source, ring_name, shape, slots, conn, stop_event):
+    """采集进程：从 conn 收到空闲槽位号，把帧写进槽位，再把 (序号, 槽位, 时间) 发回主进程"""
+    # 只通过 stop_event 退出，Ctrl+C 由主进程处理
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    ring = FrameRing(shape, slots, ring_name)
+    frames = open_source(source, shape)
+    sequence = 0
+    try:
+        while not stop_event.is_set():
+            if not conn.poll(0.05):
+                # 推理跟不上时丢弃旧帧，保持画面最新
+                frames.skip()
+                continue
+            try:
+                slot = conn.recv()
+            except EOFError:
+                break
+            if not frames.read_into(ring.frames[slot]):
+                print(f"摄像头 {camera_id} 无法读取帧")
+                break
+            conn.send((sequence, slot, time.time()))
+            sequence += 1
+    finally:
+        frames.release()
+        ring.close()
+        conn.close()
+
+def worker_process(worker_id, ring_names, shape, slots, conn, threads):
+    """推理进程：各自加载一份模型，从 conn 收任务，从帧环读取帧推理后把结果发回
+
+    槽位的归还和序号的跟踪都由主进程负责，进程异常退出时主进程可以全部收回。
+    """
+    # 只通过主进程发送的 None 退出，Ctrl+C 由主进程处理
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    import torch
+    from ultralytics import YOLO
+    from roi_inference import RoiInference
+
+    # 限制每个进程的线程数，避免多进程抢占 CPU
+    torch.set_num_threads(threads)
+    model = YOLO(MODEL_PATH)
+    rings = {camera_id: FrameRing(shape, slots, name) for camera_id, name in ring_names.items()}
+    runner = RoiInference(model, shape) if USE_ROI_INFERENCE else None
+
+    try:
+        while True:
+            try:
+                task = conn.recv()
+            except EOFError:
+                break
+            if task is None:
+                break
+            camera_id, sequence, slot, capture_time = task
+            frame = rings[camera_id].frames[slot]
+            try:
+                if runner:
+                    detections = runner(frame)
+                else:
+                    detections = model(frame, verbose=False)[0].boxes.data.tolist()
+            except Exception as e:
+                print(f"推理进程 {worker_id} 出错: {e}")
+                detections = []
+            finally:
+                # 不再引用共享内存，否则关闭帧环时会 BufferError
+                frame = None
+            conn.send((camera_id, sequence, detections, capture_time))
+    finally:
+        for ring in rings.values():
+            ring.close()
+        conn.close()
+
+class SerialSorter:
+    """按检测结果变化向分拣 Arduino 发送指令"""
+
+    def __init__(self, port_name):
+        self.serial_port = None
+        self.last_valid_label = None
+        if port_name:
+            import serial
+            try:
+                self.serial_port = serial.Serial(port_name, 9600, timeout=1)
+                print(f"串口 {port_name} 连接成功！")
+                time.sleep(2)  # 等待Arduino重置和串口稳定
+            except Exception as e:
+                print(f"串口 {port_name} 初始化失败: {e}")
+
+    def update(self, label):
+        if label == self.last_valid_label:
+            return None
+        if label == "good":
+            command = b'd'
+        elif label == "bad":
+            command = b'u'
+        elif label is None:  # 没有检测到时不发送指令
+            command = None
+        else:
+            return None
+        self.last_valid_label = label
+        if command and self.serial_port:
+            self.serial_port.write(command)
+            self.serial_port.flush()
+        return command
+
+    def close(self):
+        if self.serial_port:
+            self.serial_port.close()
+
+def run_server(cameras, num_workers, duration=None, route=True):
+    """启动采集和推理进程，按摄像头顺序处理结果，返回整体吞吐量 (帧/秒)"""
+    from ultralytics import YOLO
+    names = YOLO(MODEL_PATH).names
+
+    ctx = mp.get_context("spawn")
+    stop_event = ctx.Event()
+
+    rings = {camera_id: FrameRing(FRAME_SHAPE, SLOTS_PER_CAMERA) for camera_id in range(len(cameras))}
+    ring_names = {camera_id: ring.name for camera_id, ring in rings.items()}
+
+    sorters = {}
+    if route:
+        sorters = {camera_id: SerialSorter(port) for camera_id, (_, port) in enumerate(cameras)}
+
+    # 采集进程：每个摄像头一条 Pipe，主进程发空闲槽位，采集进程发新帧
+    capture_conns = {}
+    captures = []
+    for camera_id, (source, _) in enumerate(cameras):
+        main_conn, child_conn = ctx.Pipe()
+        process = ctx.Process(target=capture_process,
+                              args=(camera_id, source, ring_names[camera_id], FRAME_SHAPE, SLOTS_PER_CAMERA,
+                                    child_conn, stop_event))
+        process.start()
+        child_conn.close()
+        for slot in range(SLOTS_PER_CAMERA):
+            main_conn.send(slot)
+        capture_conns[camera_id] = main_conn
+        captures.append(process)
+
+    # 推理进程：每个进程一条 Pipe，主进程发任务，推理进程发结果
+    threads = max(1, (os.cpu_count() or 1) // num_workers)
+    workers = [None] * num_workers
+    worker_conns = [None] * num_workers
+    in_flight = [{} for _ in range(num_workers)]  # 已分配未返回的任务 (摄像头, 序号) -> 槽位
+    restarts = [0] * num_workers
+
+    def start_worker(worker_id):
+        main_conn, child_conn = ctx.Pipe()
+        process = ctx.Process(target=worker_process,
+                              args=(worker_id, ring_names, FRAME_SHAPE, SLOTS_PER_CAMERA, child_conn, threads))
+        process.start()
+        child_conn.close()
+        workers[worker_id] = process
+        worker_conns[worker_id] = main_conn
+
+    def release_slot(camera_id, slot):
+        # 采集进程已经退出时不再归还
+        if camera_id in capture_conns:
+            try:
+                capture_conns[camera_id].send(slot)
+            except OSError:
+                pass
+
+    def reclaim_worker(worker_id):
+        """推理进程异常退出：收回它的槽位，跳过它的序号，然后重启"""
+        process = workers[worker_id]
+        process.join(timeout=1.0)
+        print(f"推理进程 {worker_id} 异常退出 (exitcode {process.exitcode})")
+        for (camera_id, sequence), slot in in_flight[worker_id].items():
+            release_slot(camera_id, slot)
+            if sequence >= next_sequence[camera_id]:
+                pending[camera_id].setdefault(sequence, None)
+        in_flight[worker_id] = {}
+        worker_conns[worker_id].close()
+        if restarts[worker_id] < MAX_WORKER_RESTARTS:
+            restarts[worker_id] += 1
+            print(f"重新启动推理进程 {worker_id}")
+            start_worker(worker_id)
+        else:
+            print(f"推理进程 {worker_id} 重启次数过多，不再重启")
+            workers[worker_id] = None
+            worker_conns[worker_id] = None
+
+    def dispatch():
+        """把等待中的帧分给负载最低的推理进程"""
+        while backlog:
+            candidates = [w for w in range(num_workers)
+                          if workers[w] is not None and len(in_flight[w]) < MAX_IN_FLIGHT]
+            if not candidates:
+                return
+            worker_id = min(candidates, key=lambda w: len(in_flight[w]))
+            camera_id, sequence, slot, capture_time = backlog.popleft()
+            in_flight[worker_id][(camera_id, sequence)] = slot
+            try:
+                worker_conns[worker_id].send((camera_id, sequence, slot, capture_time))
+            except OSError:
+                reclaim_worker(worker_id)
+
+    # 每个摄像头的下一个待输出序号和乱序到达的结果（None 表示已确认丢失的序号）
+    next_sequence = {camera_id: 0 for camera_id in rings}
+    pending = {camera_id: {} for camera_id in rings}
+    waiting_since = {camera_id: None for camera_id in rings}  # 开始等待缺失序号的时间
+    backlog = deque()  # 已采集但还没分配给推理进程的帧
+    processed = 0
+    latencies = []
+
+    for worker_id in range(num_workers):
+        start_worker(worker_id)
+    # 等第一个结果出现再计时，排除模型加载时间
+    start_time = None
+    report_time = time.time()
+    report_count = 0
+
+    try:
+        while True:
+            conn_owner = {conn: ("capture", camera_id) for camera_id, conn in capture_conns.items()}
+            conn_owner.update({conn: ("worker", worker_id)
+                               for worker_id, conn in enumerate(worker_conns) if conn is not None})
+            for conn in wait(list(conn_owner), timeout=0.5):
+                kind, owner_id = conn_owner[conn]
+                if kind == "capture":
+                    try:
+                        sequence, slot, capture_time = conn.recv()
+                    except (EOFError, OSError):
+                        # 采集进程已退出
+                        conn.close()
+                        del capture_conns[owner_id]
+                        continue
+                    backlog.append((owner_id, sequence, slot, capture_time))
+                else:
+                    try:
+                        camera_id, sequence, detections, capture_time = conn.recv()
+                    except (EOFError, OSError):
+                        reclaim_worker(owner_id)
+                        continue
+                    slot = in_flight[owner_id].pop((camera_id, sequence), None)
+                    if slot is None:
+                        continue
+                    release_slot(camera_id, slot)
+                    if sequence >= next_sequence[camera_id]:
+                        pending[camera_id][sequence] = (detections, capture_time)
+                    if start_time is None:
+                        start_time = report_time = time.time()
+            now = time.time()
+
+            # 没有发出 EOF 就退出的推理进程也要收回
+            for worker_id, process in enumerate(workers):
+                if process is not None and not process.is_alive():
+                    reclaim_worker(worker_id)
+            if not any(workers):
+                print("没有可用的推理进程，退出")
+                break
+            dispatch()
+
+            if not capture_conns and not backlog and not any(in_flight):
+                break
+
+            # 按序号顺序输出，缺失的序号等待超时后跳过
+            for camera_id in rings:
+                camera_pending = pending[camera_id]
+                while camera_pending:
+                    if next_sequence[camera_id] not in camera_pending:
+                        if waiting_since[camera_id] is None:
+                            waiting_since[camera_id] = now
+                        if now - waiting_since[camera_id] < RESULT_TIMEOUT:
+                            break
+                        skip_to = min(camera_pending)
+                        print(f"摄像头 {camera_id} 序号 {next_sequence[camera_id]}-{skip_to - 1} 超时未返回，跳过")
+                        next_sequence[camera_id] = skip_to
+                    waiting_since[camera_id] = None
+
+                    result = camera_pending.pop(next_sequence[camera_id])
+                    next_sequence[camera_id] += 1
+                    if result is None:
+                        continue
+                    detections, capture_time = result
+                    processed += 1
+                    report_count += 1
+                    latencies.append(now - capture_time)
+
+                    label = names[int(detections[0][5])] if detections else None
+                    if camera_id in sorters:
+                        command = sorters[camera_id].update(label)
+                        if command:
+                            print(f"摄像头 {camera_id} 发送到串口: {command.decode()}")
+
+            if start_time is None:
+                continue
+            if now - report_time >= REPORT_INTERVAL and latencies:
+                print(f"{num_workers} 个推理进程: {report_count / (now - report_time):.1f} 帧/秒, "
+                      f"平均延迟 {sum(latencies) / len(latencies) * 1000:.1f} ms")
+                report_time = now
+                report_count = 0
+                latencies = []
+
+            if duration and now - start_time >= duration:
+                break
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop_event.set()
+        for process in captures:
+            process.join()
+        for conn in capture_conns.values():
+            conn.close()
+        # 通知推理进程退出，并读掉剩余结果，避免它们阻塞在发送上
+        for worker_id, conn in enumerate(worker_conns):
+            if conn is None:
+                continue
+            try:
+                conn.send(None)
+            except OSError:
+                continue
+            try:
+                while conn.poll(RESULT_TIMEOUT):
+                    conn.recv()
+            except (EOFError, OSError):
+                pass
+        for process in workers:
+            if process is None:
+                continue
+            process.join(timeout=RESULT_TIMEOUT)
+            if process.is_alive():
+                # 卡住的推理进程直接结束
+                process.terminate()
+                process.join()
+        for conn in worker_conns:
+            if conn is not None:
+                conn.close()
+        for sorter in sorters.values():
+            sorter.close()
+        for ring in rings.values():
+            ring.close()
+            ring.unlink()
+
+    elapsed = time.time() - start_time if start_time else 0
+    return processed / elapsed if elapsed else 0
+
+def run_benchmark(max_workers):
+    """用回放图片压测不同推理进程数下的吞吐量"""
+    cameras = [(BENCH_SOURCE, None)] * BENCH_CAMERAS
+    counts = []
+    count = 1
+    while count < max_workers:
+        counts.append(count)
+        count *= 2
+    counts.append(max_workers)
+
+    results = []
+    for count in counts:
+        print(f"压测 {count} 个推理进程，{BENCH_CAMERAS} 路摄像头，{BENCH_SECONDS:.0f} 秒...")
+        fps = run_server(cameras, count, duration=BENCH_SECONDS, route=False)
+        results.append((count, fps))
+
+    baseline = results[0][1] or 1
+    print("推理进程数  帧/秒  加速比")
+    for count, fps in results:
+        print(f"{count:>10}  {fps:6.1f}  {fps / baseline:5.2f}x")
+
+if __name__ == "__main__":
+    # 用法: python inference_server.py [推理进程数]
+    #       python inference_server.py bench [最大推理进程数]
+    if len(sys.argv) > 1 and sys.argv[1] == "bench":
+        run_benchmark(int(sys.argv[2]) if len(sys.argv) > 2 else NUM_WORKERS)
+    else:
+        run_server(CAMERAS, int(sys.argv[1]) if len(sys.argv) > 1 else NUM_WORKERS)
@@ -0,0 +1,142 @@
+import cv2
+import os
+import sys
+import time
+from ultralytics import YOLO
+from roi_inference import RoiInference, BELT_ROI
+
+# 对比通用推理与固定 ROI 推理的延迟和精度
+MODEL_PATH = 'best.pt'
+# 默认验证集，可在命令行指定其他图片/标签文件夹
+VALID_IMAGES = 'gnocchi_data/valid/images'
+VALID_LABELS = 'gnocchi_data/valid/labels'
+BENCH_ROI = BELT_ROI  # 要验证的传送带 ROI，整图固定尺寸路径总是一起测
+IOU_THRESHOLD = 0.5
+WARMUP_FRAMES = 5
+
+def load_labels(label_path, width, height):
+    """读取 YOLO 格式标签，返回 [(x1, y1, x2, y2, cls), ...]"""
+    boxes = []
+    if not os.path.exists(label_path):
+        return boxes
+    with open(label_path) as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) < 5:
+                continue
+            cls, cx, cy, w, h = int(parts[0]), *map(float, parts[1:5])
+            boxes.append(((cx - w / 2) * width, (cy - h / 2) * height,
+                          (cx + w / 2) * width, (cy + h / 2) * height, cls))
+    return boxes
+
+def in_roi(box, roi):
+    """标签中心是否在 ROI 内"""
+    if roi is None:
+        return True
+    x, y, w, h = roi
+    cx, cy = (box[0] + box[2]) / 2, (box[1] + box[3]) / 2
+    return x <= cx < x + w and y <= cy < y + h
+
+def iou(a, b):
+    ix = max(0, min(a[2], b[2]) - max(a[0], b[0]))
+    iy = max(0, min(a[3], b[3]) - max(a[1], b[1]))
+    inter = ix * iy
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0
+
+def match_detections(detections, labels):
+    """按置信度贪心匹配，返回 (正确数, 检测数, 标签数)"""
+    used = set()
+    correct = 0
+    for det in sorted(detections, key=lambda d: -d[4]):
+        for i, label in enumerate(labels):
+            if i not in used and int(det[5]) == label[4] and iou(det, label) >= IOU_THRESHOLD:
+                used.add(i)
+                correct += 1
+                break
+    return correct, len(detections), len(labels)
+
+def report(name, times, stats):
+    correct, detected, expected = stats
+    precision = correct / detected if detected else 0
+    recall = correct / expected if expected else 0
+    print(f"{name}: 平均 {sum(times) / len(times) * 1000:.2f} ms/帧, "
+          f"precision {precision:.3f}, recall {recall:.3f}")
+
+def main(image_folder=VALID_IMAGES, label_folder=VALID_LABELS):
+    if not os.path.isdir(image_folder):
+        print(f"找不到图片文件夹: {image_folder}")
+        return
+    model = YOLO(MODEL_PATH)
+    images = sorted(f for f in os.listdir(image_folder) if f.lower().endswith(('.jpg', '.jpeg', '.png')))
+    if not images:
+        print(f"{image_folder} 中没有图片")
+        return
+
+    # 每条固定尺寸路径都和通用推理在同一批目标上比较
+    paths = [("整图固定尺寸", None)]
+    if BENCH_ROI is not None:
+        paths.append((f"ROI {BENCH_ROI}", BENCH_ROI))
+    runners = {}  # 按 (路径, 图片尺寸) 缓存
+    generic_times = []
+    path_times = {name: [] for name, _ in paths}
+    path_stats = {name: [0, 0, 0] for name, _ in paths}
+    generic_stats = {name: [0, 0, 0] for name, _ in paths}
+
+    for index, image_name in enumerate(images):
+        frame = cv2.imread(os.path.join(image_folder, image_name))
+        if frame is None:
+            continue
+        height, width = frame.shape[:2]
+        labels = load_labels(os.path.join(label_folder, os.path.splitext(image_name)[0] + '.txt'), width, height)
+
+        # 通用推理（ultralytics 自带 letterbox）
+        start = time.perf_counter()
+        generic = model(frame, verbose=False)[0].boxes.data.tolist()
+        generic_time = time.perf_counter() - start
+        # 预热帧不计时
+        if index >= WARMUP_FRAMES:
+            generic_times.append(generic_time)
+
+        for name, roi in paths:
+            runner = runners.get((name, frame.shape))
+            if runner is None:
+                runner = runners[(name, frame.shape)] = RoiInference(model, frame.shape, roi)
+
+            # 固定 ROI、固定尺寸推理
+            start = time.perf_counter()
+            detections = runner(frame)
+            roi_time = time.perf_counter() - start
+            if index >= WARMUP_FRAMES:
+                path_times[name].append(roi_time)
+
+            # 两条路径都只统计 ROI 内的目标
+            roi_labels = [b for b in labels if in_roi(b, runner.roi)]
+            roi_generic = [d for d in generic if in_roi(d, runner.roi)]
+            for total, stats in ((generic_stats[name], match_detections(roi_generic, roi_labels)),
+                                 (path_stats[name], match_detections(detections, roi_labels))):
+                for i in range(3):
+                    total[i] += stats[i]
+
+    if not generic_times:
+        print("图片数量不足以完成计时")
+        return
+
+    print(f"共 {len(images)} 张图片，IoU 阈值 {IOU_THRESHOLD}")
+    for name, _ in paths:
+        print(f"[{name}]")
+        report("通用推理", generic_times, generic_stats[name])
+        report("固定尺寸推理", path_times[name], path_stats[name])
+        saved = (sum(generic_times) - sum(path_times[name])) / len(generic_times) * 1000
+        print(f"每帧节省 {saved:.2f} ms")
+
+if __name__ == "__main__":
+    # 用法: python roi_benchmark.py [图片文件夹] [标签文件夹]
+    #       例如 python roi_benchmark.py gnocchi_data/test/images gnocchi_data/test/labels
+    #       只给图片文件夹时，标签默认在同级的 labels 文件夹
+    if len(sys.argv) > 1:
+        images_arg = sys.argv[1]
+        labels_arg = sys.argv[2] if len(sys.argv) > 2 else os.path.join(os.path.dirname(os.path.normpath(images_arg)), 'labels')
+        main(images_arg, labels_arg)
+    else:
+        main()
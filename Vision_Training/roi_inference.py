@@ -0,0 +1,93 @@
+import cv2
+import numpy as np
+import torch
+
+# 传送带区域 (x, y, 宽, 高)，None 表示使用整帧
+# 设置前先用 roi_benchmark.py 在验证集上确认精度
+BELT_ROI = None
+# 模型输入长边，按比例缩放后居中补边到 32 的倍数（与 ultralytics LetterBox 默认的居中方式一致）
+INPUT_SIZE = 640
+MODEL_STRIDE = 32
+PAD_VALUE = 114  # ultralytics letterbox 的填充灰度
+
+class RoiInference:
+    """裁剪固定 ROI 并缩放到固定尺寸的预分配输入张量，避免每帧重新分配内存"""
+
+    def __init__(self, model, frame_shape, roi=BELT_ROI, input_size=INPUT_SIZE, device=None):
+        self.model = model
+        # 与 ultralytics 默认设备一致，张量已在目标设备上时推理前不会再拷贝
+        self.device = device or ("cuda:0" if torch.cuda.is_available() else "cpu")
+        frame_height, frame_width = frame_shape[:2]
+        if roi is None:
+            roi = (0, 0, frame_width, frame_height)
+
+        # ROI 限制在画面范围内
+        x, y, w, h = roi
+        x = max(0, min(x, frame_width - 1))
+        y = max(0, min(y, frame_height - 1))
+        w = min(w, frame_width - x)
+        h = min(h, frame_height - y)
+        self.roi = (x, y, w, h)
+
+        # 等比例缩放，长边为 input_size，宽高不变形
+        self.scale = min(input_size / w, input_size / h)
+        self.resized_width = max(1, int(round(w * self.scale)))
+        self.resized_height = max(1, int(round(h * self.scale)))
+
+        # 补边到 stride 的倍数，ultralytics 不再做 letterbox
+        self.input_width = -(-self.resized_width // MODEL_STRIDE) * MODEL_STRIDE
+        self.input_height = -(-self.resized_height // MODEL_STRIDE) * MODEL_STRIDE
+        # 图像居中，左/上的补边取整方式同 ultralytics LetterBox
+        self.pad_left = int(round((self.input_width - self.resized_width) / 2 - 0.1))
+        self.pad_top = int(round((self.input_height - self.resized_height) / 2 - 0.1))
+
+        # 预分配缓冲区，每帧复用；补边区域只在这里填充一次
+        self.resized = np.empty((self.resized_height, self.resized_width, 3), dtype=np.uint8)
+        self.rgb = np.full((self.input_height, self.input_width, 3), PAD_VALUE, dtype=np.uint8)
+        self.rgb_chw = torch.from_numpy(self.rgb).permute(2, 0, 1)  # 与 self.rgb 共享内存
+        self.tensor = torch.empty((1, 3, self.input_height, self.input_width), dtype=torch.float32, device=self.device)
+
+    @property
+    def input_shape(self):
+        return self.input_height, self.input_width
+
+    def prepare(self, frame):
+        """裁剪 ROI 并写入预分配的输入张量"""
+        x, y, w, h = self.roi
+        cv2.resize(frame[y:y + h, x:x + w], (self.resized_width, self.resized_height),
+                   dst=self.resized, interpolation=cv2.INTER_LINEAR)
+        # BGR -> RGB 直接写入补边缓冲区的中间
+        self.rgb[self.pad_top:self.pad_top + self.resized_height,
+                 self.pad_left:self.pad_left + self.resized_width] = self.resized[..., ::-1]
+        self.tensor[0].copy_(self.rgb_chw)
+        self.tensor.mul_(1 / 255.0)
+        return self.tensor
+
+    def __call__(self, frame, **kwargs):
+        """推理一帧，返回原图坐标下的检测结果 [(x1, y1, x2, y2, conf, cls), ...]"""
+        results = self.model(self.prepare(frame), device=self.device, verbose=False, **kwargs)
+        return self.to_frame_coords(results[0].boxes.data.tolist())
+
+    def to_frame_coords(self, detections):
+        """把输入张量坐标映射回整帧坐标"""
+        x, y, w, h = self.roi
+        mapped = []
+        for x1, y1, x2, y2, conf, cls in detections:
+            # 去掉补边偏移，同一个缩放比例，并裁掉落在补边区域的部分
+            x1, x2 = (min(max((v - self.pad_left) / self.scale, 0), w) + x for v in (x1, x2))
+            y1, y2 = (min(max((v - self.pad_top) / self.scale, 0), h) + y for v in (y1, y2))
+            mapped.append((x1, y1, x2, y2, conf, cls))
+        return mapped
+
+def draw_detections(frame, detections, names, roi=None):
+    """在整帧上绘制 ROI 和检测框"""
+    annotated = frame.copy()
+    if roi is not None:
+        x, y, w, h = roi
+        cv2.rectangle(annotated, (x, y), (x + w, y + h), (255, 255, 0), 1)
+    for x1, y1, x2, y2, conf, cls in detections:
+        color = (0, 255, 0) if names[int(cls)] == "good" else (0, 0, 255)
+        cv2.rectangle(annotated, (int(x1), int(y1)), (int(x2), int(y2)), color, 2)
+        cv2.putText(annotated, f"{names[int(cls)]} {conf:.2f}", (int(x1), int(y1) - 5),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.6, color, 2)
+    return annotated
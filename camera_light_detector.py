@@ -1,17 +1,29 @@
 import cv2
 import numpy as np
+import json
 import os
 import time
+from capture_publisher import CapturePublisher
+from capture_dedup import CaptureFilter
+from frame_governor import FrameRateGovernor, IDLE_INTERVAL
 
 SAVE_FOLDER = r"H:\person\p"
 LIGHT_THRESHOLD = 200  
 BRIGHT_AREA_THRESHOLD = 0.10 
 STABILITY_FRAMES = 10  # Changed to 10 frames for stable dark detection
+NOMINAL_FPS = 30  # Frame rate STABILITY_FRAMES was tuned at
+STABILITY_TIME = STABILITY_FRAMES / NOMINAL_FPS  # Seconds of darkness needed, independent of frame rate
 COOLDOWN_TIME = 2.0  
 CAMERA_INDEX = 0 
 HORIZONTAL_RESOLUTION = (1024, 768) 
 VERTICAL_RESOLUTION = (768, 1024)   
 current_orientation = "horizontal"  
+PUBLISH_CAPTURES = False  # Push captures straight to the ComfyUI/TouchDesigner stage
+publisher = None
+DUPLICATE_FILTER = True  # Check captures against recent ones before saving
+DUPLICATE_ACTION = "tag"  # "tag" saves near-duplicates with an N.json note next to N.jpg, "skip" drops them
+# Switch to "skip" only after checking DUPLICATE_DISTANCE against real captures
+capture_filter = CaptureFilter() if DUPLICATE_FILTER else None
 
 def ensure_folder_exists():
     if not os.path.exists(SAVE_FOLDER):
@@ -27,7 +39,11 @@ def get_next_filename():
     ensure_folder_exists()
     
     try:
-        files = [f for f in os.listdir(SAVE_FOLDER) if f.endswith('.jpg') and f[:-4].isdigit()]
+        files = os.listdir(SAVE_FOLDER)
+        if publisher:
+            # Include captures still waiting in the archive queue
+            files.extend(publisher.pending_files())
+        files = [f for f in files if f.endswith('.jpg') and f[:-4].isdigit()]
         
         # If no files, start from 1
         if not files:
@@ -65,7 +81,7 @@ def resize_image(frame, orientation):
     else:  # vertical
         return cv2.resize(frame, VERTICAL_RESOLUTION)
 
-def save_image(frame, filename, orientation):
+def save_image(frame, filename, orientation, extra=None, capture_time=None):
     """Save image to file without display text"""
     # Use a copy of the original frame
     clean_frame = frame.copy()
@@ -73,6 +89,15 @@ def save_image(frame, filename, orientation):
     # Resize the image
     resized_frame = resize_image(clean_frame, orientation)
     
+    # Publish to consumers and archive in the background
+    if publisher:
+        try:
+            publisher.publish(resized_frame, filename, orientation, capture_time, extra)
+            return True
+        except Exception as e:
+            print(f"Failed to publish image: {e}")
+            return False
+    
     # Save the image
     try:
         cv2.imwrite(filename, resized_frame)
@@ -82,7 +107,40 @@ def save_image(frame, filename, orientation):
         print(f"Failed to save image: {e}")
         return False
 
-def add_display_info(frame, has_strong_light, bright_ratio, time_since_last_capture, stable_frames, waiting_for_light_change):
+def save_tag(filename, extra):
+    """Write capture metadata to a sidecar N.json next to N.jpg"""
+    tag_filename = os.path.splitext(filename)[0] + ".json"
+    try:
+        with open(tag_filename, "w") as f:
+            json.dump(extra, f)
+    except Exception as e:
+        print(f"Failed to save tag: {e}")
+
+def capture_photo(frame, orientation, capture_time=None):
+    """Save a capture unless it duplicates a recent one, returns the filename or None"""
+    extra = None
+    if capture_filter:
+        hash_value, match, hash_ms, lookup_ms = capture_filter.check(frame)
+        if match:
+            distance, name = match
+            print(f"Near-duplicate of {name} (distance {distance}, hash {hash_ms:.2f} ms, lookup {lookup_ms:.2f} ms)")
+            if DUPLICATE_ACTION == "skip":
+                return None
+            extra = {"duplicate_of": name, "duplicate_distance": distance}
+        else:
+            print(f"Unique capture (hash {hash_ms:.2f} ms, lookup {lookup_ms:.2f} ms)")
+    
+    filename = get_next_filename()
+    if not save_image(frame, filename, orientation, extra, capture_time):
+        return None
+    if extra:
+        # Keep the tag on disk too, not only in the published metadata
+        save_tag(filename, extra)
+    if capture_filter:
+        capture_filter.add(hash_value, os.path.basename(filename))
+    return filename
+
+def add_display_info(frame, has_strong_light, bright_ratio, time_since_last_capture, stable_time, waiting_for_light_change, idle):
     """Add information text to the display frame without affecting saved images"""
     display_frame = frame.copy()
     
@@ -99,23 +157,30 @@ def add_display_info(frame, has_strong_light, bright_ratio, time_since_last_capt
     orientation_text = f"Orientation: {'Horizontal' if current_orientation == 'horizontal' else 'Vertical'}"
     cv2.putText(display_frame, orientation_text, (10, 90), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 0), 2)
     
-    # Add frame count and mode information
+    # Add stable time and mode information
     if waiting_for_light_change:
         mode_text = "Mode: Waiting for light change"
     else:
-        mode_text = f"Mode: Counting stable frames {stable_frames}/{STABILITY_FRAMES}"
+        mode_text = f"Mode: Counting stable time {stable_time:.2f}/{STABILITY_TIME:.2f}s"
     cv2.putText(display_frame, mode_text, (10, 120), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 165, 0), 2)
     
+    # Add frame rate mode
+    rate_text = f"Frame rate: {'Idle' if idle else 'Full'}"
+    cv2.putText(display_frame, rate_text, (10, 150), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (200, 200, 200), 2)
+    
     return display_frame
 
 def main():
-    global current_orientation
+    global current_orientation, publisher
     
     # Ensure folder exists
     if not ensure_folder_exists():
         print("Unable to create save folder, program exiting")
         return
     
+    if PUBLISH_CAPTURES:
+        publisher = CapturePublisher()
+    
     # Initialize camera
     cap = cv2.VideoCapture(CAMERA_INDEX)
     
@@ -123,6 +188,9 @@ def main():
         print("Cannot open camera, please check connection or change camera index")
         return
     
+    # Keep only the newest frame so slow idle polling does not read stale frames
+    cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+    
     # Get camera resolution
     frame_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
     frame_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
@@ -137,79 +205,97 @@ def main():
     
     # Status variables
     last_capture_time = 0
-    stable_dark_frames = 0  # Count of consecutive dark frames
+    dark_since = None  # Time of the first dark sample in the current dark streak
+    last_bright_time = None  # When strong light was last seen, for trigger latency
     was_bright = False  # Initial state set to no strong light
     initial_capture_done = False  # Track if we've already captured the initial photo
     waiting_for_light_change = False  # Flag to indicate we're waiting for light to change from bright to dark
+    governor = FrameRateGovernor()
     
     try:
         while True:
             # Read a frame
             ret, frame = cap.read()
+            read_time = time.time()  # Passed on so consumers measure latency from the camera read
             if not ret:
                 print("Cannot get image, exiting program")
                 break
             
-            # Detect strong light
-            has_strong_light, bright_ratio = detect_strong_light(frame)
+            # Detect strong light (on a sparse grid while idle)
+            has_strong_light, bright_ratio = detect_strong_light(governor.sample(frame))
             
             current_time = time.time()
             time_since_last_capture = current_time - last_capture_time
+            if has_strong_light:
+                last_bright_time = current_time
             
             # Add information to display frame
             display_frame = add_display_info(frame, has_strong_light, bright_ratio, 
-                                            time_since_last_capture, stable_dark_frames, 
-                                            waiting_for_light_change)
+                                            time_since_last_capture, 
+                                            current_time - dark_since if dark_since else 0.0, 
+                                            waiting_for_light_change, governor.idle)
             
             # Show real-time display (with text information)
             cv2.imshow("Camera Light Monitor", display_frame)
             
             # State machine logic
             if not initial_capture_done:
-                # Initial state: Counting frames until first capture
+                # Initial state: Counting dark time until first capture
                 if not has_strong_light:
-                    stable_dark_frames += 1
-                    if stable_dark_frames >= STABILITY_FRAMES and time_since_last_capture >= COOLDOWN_TIME:
+                    if dark_since is None:
+                        dark_since = current_time
+                    if current_time - dark_since >= STABILITY_TIME and time_since_last_capture >= COOLDOWN_TIME:
                         # Take the initial photo
-                        filename = get_next_filename()
-                        save_image(frame, filename, current_orientation)
+                        if capture_photo(frame, current_orientation, read_time):
+                            print("Initial capture complete. Now waiting for light to change.")
+                        else:
+                            print("Initial capture skipped. Now waiting for light to change.")
                         last_capture_time = current_time
-                        stable_dark_frames = 0
+                        dark_since = None
                         initial_capture_done = True
                         waiting_for_light_change = True
-                        print("Initial capture complete. Now waiting for light to change.")
                 else:
-                    stable_dark_frames = 0
+                    dark_since = None
             
             elif waiting_for_light_change:
                 # Wait for light to change from bright to dark
                 if has_strong_light:
                     was_bright = True
+                    dark_since = None  # Interrupted darkness starts over
                 elif was_bright and not has_strong_light:
                     # Light changed from bright to dark
-                    stable_dark_frames += 1
-                    if stable_dark_frames >= STABILITY_FRAMES and time_since_last_capture >= COOLDOWN_TIME:
+                    if dark_since is None:
+                        dark_since = current_time
+                    if current_time - dark_since >= STABILITY_TIME and time_since_last_capture >= COOLDOWN_TIME:
                         # Take photo after light change
-                        filename = get_next_filename()
-                        save_image(frame, filename, current_orientation)
+                        if capture_photo(frame, current_orientation, read_time):
+                            print(f"Trigger latency: {(current_time - last_bright_time) * 1000:.0f} ms "
+                                  f"(stability time {STABILITY_TIME * 1000:.0f} ms)")
+                            print("Light change capture complete. Waiting for next light change.")
+                        else:
+                            print("Light change capture skipped. Waiting for next light change.")
                         last_capture_time = current_time
-                        stable_dark_frames = 0
+                        dark_since = None
                         was_bright = False
-                        print("Light change capture complete. Waiting for next light change.")
                 elif not has_strong_light and not was_bright:
                     # Still dark, but we're waiting for it to be bright first
                     pass
                 else:
-                    stable_dark_frames = 0
+                    dark_since = None
+            
+            # Idle unless darkness is being counted toward a capture that cooldown allows soon
+            cooldown_remaining = COOLDOWN_TIME - (current_time - last_capture_time)
+            governor.update(bright_ratio, current_time,
+                            dark_since is None or cooldown_remaining > IDLE_INTERVAL)
             
-            # Key handling
-            key = cv2.waitKey(1)
+            # Key handling (also the pause between frames)
+            key = cv2.waitKey(governor.wait_ms())
             if key == 27:  # ESC key
                 break
             elif key == ord('c'):  # Press C to take photo manually
-                filename = get_next_filename()
-                save_image(frame, filename, current_orientation)
-                print(f"Manual capture: {os.path.basename(filename)}")
+                filename = capture_photo(frame, current_orientation, read_time)
+                if filename:
+                    print(f"Manual capture: {os.path.basename(filename)}")
                 last_capture_time = current_time
             elif key == ord('o'):  # Press O to switch orientation
                 current_orientation = "vertical" if current_orientation == "horizontal" else "horizontal"
@@ -217,7 +303,7 @@ def main():
             elif key == ord('r'):  # Press R to reset the state machine
                 initial_capture_done = False
                 waiting_for_light_change = False
-                stable_dark_frames = 0
+                dark_since = None
                 was_bright = False
                 print("State machine reset. Starting over.")
     
@@ -225,6 +311,8 @@ def main():
         # Release resources
         cap.release()
         cv2.destroyAllWindows()
+        if publisher:
+            publisher.close()
         print("Program exited")
 
 if __name__ == "__main__":
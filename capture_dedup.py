@@ -0,0 +1,109 @@
+import cv2
+import numpy as np
+import time
+from collections import deque
+
+# Duplicate filter settings
+HASH_SIZE = 8  # 8x8 difference hash = 64 bits
+DUPLICATE_DISTANCE = 6  # Max Hamming distance that still counts as the same picture
+RECENT_CAPTURES = 50  # How many recent captures are kept in the index
+RECENT_SECONDS = 30.0  # Captures older than this are forgotten, so only repeats close in time match
+
+def dhash(frame, hash_size=HASH_SIZE):
+    """Compute the difference hash of a frame as an integer"""
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+    # One extra column so each row gives hash_size left/right comparisons
+    small = cv2.resize(gray, (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
+    bits = small[:, 1:] > small[:, :-1]
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+def hamming_distance(a, b):
+    """Number of differing bits between two hashes"""
+    return bin(a ^ b).count("1")
+
+class BKTree:
+    """Burkhard-Keller tree for Hamming-distance lookups over hashes"""
+
+    def __init__(self):
+        self.root = None
+
+    def add(self, hash_value, name):
+        node = (hash_value, name, {})
+        if self.root is None:
+            self.root = node
+            return
+
+        current = self.root
+        while True:
+            distance = hamming_distance(hash_value, current[0])
+            child = current[2].get(distance)
+            if child is None:
+                current[2][distance] = node
+                return
+            current = child
+
+    def find_nearest(self, hash_value, max_distance):
+        """Return (distance, name) of the closest hash within max_distance, or None"""
+        if self.root is None:
+            return None
+
+        best = None
+        candidates = [self.root]
+        while candidates:
+            node_hash, node_name, children = candidates.pop()
+            distance = hamming_distance(hash_value, node_hash)
+            if distance <= max_distance and (best is None or distance < best[0]):
+                best = (distance, node_name)
+
+            # Triangle inequality: only subtrees in [d - r, d + r] can match
+            limit = best[0] if best else max_distance
+            for child_distance, child in children.items():
+                if distance - limit <= child_distance <= distance + limit:
+                    candidates.append(child)
+        return best
+
+class CaptureFilter:
+    """Detect near-duplicate captures against an index of recent ones"""
+
+    def __init__(self, max_distance=DUPLICATE_DISTANCE, max_recent=RECENT_CAPTURES, max_age=RECENT_SECONDS):
+        self.max_distance = max_distance
+        self.max_age = max_age
+        self.recent = deque(maxlen=max_recent)  # (hash, name, time added)
+        self.tree = BKTree()
+
+    def _rebuild(self):
+        # BK-trees cannot delete, so rebuild from the remaining window
+        self.tree = BKTree()
+        for recent_hash, recent_name, _ in self.recent:
+            self.tree.add(recent_hash, recent_name)
+
+    def _expire(self, now):
+        """Forget captures older than max_age"""
+        expired = False
+        while self.recent and now - self.recent[0][2] > self.max_age:
+            self.recent.popleft()
+            expired = True
+        if expired:
+            self._rebuild()
+
+    def check(self, frame):
+        """Hash a frame and look it up
+
+        Returns (hash, match, hash_ms, lookup_ms) where match is (distance, name) or None.
+        """
+        self._expire(time.time())
+        start = time.perf_counter()
+        hash_value = dhash(frame)
+        hashed = time.perf_counter()
+        match = self.tree.find_nearest(hash_value, self.max_distance)
+        looked_up = time.perf_counter()
+        return hash_value, match, (hashed - start) * 1000, (looked_up - hashed) * 1000
+
+    def add(self, hash_value, name):
+        """Remember a saved capture"""
+        full = len(self.recent) == self.recent.maxlen
+        self.recent.append((hash_value, name, time.time()))
+        if full:
+            self._rebuild()
+        else:
+            self.tree.add(hash_value, name)
@@ -0,0 +1,276 @@
+import cv2
+import numpy as np
+import json
+import os
+import queue
+import socket
+import struct
+import sys
+import threading
+import time
+
+# Publisher settings
+PUBLISH_HOST = "127.0.0.1"
+PUBLISH_PORT = 9980
+PUBLISH_ENCODING = "raw"  # "raw" (BGR bytes) or "png"
+HEADER_SIZE = struct.Struct("!I")  # Length prefix in front of the JSON header
+CONSUMER_QUEUE_SIZE = 2  # Captures buffered per consumer before the oldest is dropped
+SEND_TIMEOUT = 2.0  # Seconds a consumer may stall a send before it is disconnected
+CLOSE_TIMEOUT = 5.0  # Seconds each consumer gets to receive its remaining captures on exit
+
+def _recv_exact(sock, size):
+    """Read exactly size bytes from the socket, or None if it was closed"""
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    received = 0
+    while received < size:
+        count = sock.recv_into(view[received:], size - received)
+        if count == 0:
+            return None
+        received += count
+    return buffer
+
+def encode_capture(frame, metadata, encoding=PUBLISH_ENCODING):
+    """Pack a frame and its metadata into a single length-prefixed message"""
+    if encoding == "png":
+        ok, encoded = cv2.imencode(".png", frame)
+        if not ok:
+            raise ValueError("PNG encoding failed")
+        payload = encoded.tobytes()
+    else:
+        payload = np.ascontiguousarray(frame).tobytes()
+
+    header = dict(metadata)
+    header.update({
+        "encoding": encoding,
+        "shape": list(frame.shape),
+        "dtype": str(frame.dtype),
+        "payload_size": len(payload),
+    })
+    header_bytes = json.dumps(header).encode("utf-8")
+    return HEADER_SIZE.pack(len(header_bytes)) + header_bytes + payload
+
+def receive_capture(sock):
+    """Read one message from the socket and return (frame, metadata), or None when closed"""
+    prefix = _recv_exact(sock, HEADER_SIZE.size)
+    if prefix is None:
+        return None
+    header_bytes = _recv_exact(sock, HEADER_SIZE.unpack(prefix)[0])
+    if header_bytes is None:
+        return None
+    metadata = json.loads(header_bytes.decode("utf-8"))
+    payload = _recv_exact(sock, metadata["payload_size"])
+    if payload is None:
+        return None
+
+    if metadata["encoding"] == "png":
+        frame = cv2.imdecode(np.frombuffer(payload, dtype=np.uint8), cv2.IMREAD_COLOR)
+    else:
+        frame = np.frombuffer(payload, dtype=metadata["dtype"]).reshape(metadata["shape"])
+    return frame, metadata
+
+class _Consumer:
+    """One connected consumer, fed from its own queue and sender thread"""
+
+    def __init__(self, conn, address):
+        self.conn = conn
+        self.address = f"{address[0]}:{address[1]}"
+        self.conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.conn.settimeout(SEND_TIMEOUT)
+        self.queue = queue.Queue(maxsize=CONSUMER_QUEUE_SIZE)
+        self.alive = True
+        self.thread = threading.Thread(target=self._send_loop, daemon=True)
+        self.thread.start()
+
+    def _send_loop(self):
+        """Send queued messages until closed or the consumer stops reading"""
+        while True:
+            message = self.queue.get()
+            if message is None:
+                break
+            try:
+                self.conn.sendall(message)
+            except OSError:
+                # Includes send timeouts, after which the stream is no longer aligned
+                print(f"Consumer disconnected: {self.address}")
+                break
+        self.alive = False
+        self.conn.close()
+
+    def offer(self, message):
+        """Queue a message without blocking, dropping the oldest one when full"""
+        while True:
+            try:
+                self.queue.put_nowait(message)
+                return
+            except queue.Full:
+                try:
+                    self.queue.get_nowait()
+                    print(f"Consumer {self.address} is slow, dropped a capture")
+                except queue.Empty:
+                    pass
+
+    def close(self, timeout=CLOSE_TIMEOUT):
+        """Send the remaining captures, then stop the sender thread"""
+        try:
+            # Wait for room instead of dropping a queued capture for the sentinel
+            self.queue.put(None, timeout=timeout)
+        except queue.Full:
+            pass
+        self.thread.join(timeout)
+        if self.thread.is_alive():
+            print(f"Consumer {self.address} did not finish in time, closing")
+            self.conn.close()
+
+class CapturePublisher:
+    """Push captured photos to local consumers and archive them to disk in the background"""
+
+    def __init__(self, host=PUBLISH_HOST, port=PUBLISH_PORT, encoding=PUBLISH_ENCODING):
+        self.encoding = encoding
+        self.sequence = 0
+
+        # Connected consumers (e.g. TouchDesigner TCP/IP DAT or the mock consumer below)
+        self.consumers = []
+        self.consumers_lock = threading.Lock()
+
+        # Listening socket, accepted in a background thread
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server.bind((host, port))
+        self.server.listen()
+        self.running = True
+        self.accept_thread = threading.Thread(target=self._accept_loop, daemon=True)
+        self.accept_thread.start()
+
+        # Encoder, so consumers' messages are built once and off the capture loop
+        self.publish_queue = queue.Queue()
+        self.publish_thread = threading.Thread(target=self._publish_loop, daemon=True)
+        self.publish_thread.start()
+
+        # Archive writer, so cv2.imwrite never blocks the capture loop
+        self.archive_queue = queue.Queue()
+        self.pending = set()
+        self.pending_lock = threading.Lock()
+        self.archive_thread = threading.Thread(target=self._archive_loop, daemon=True)
+        self.archive_thread.start()
+
+        print(f"Capture publisher listening on {host}:{port} ({encoding})")
+
+    def _accept_loop(self):
+        """Accept consumer connections until closed"""
+        while self.running:
+            try:
+                conn, address = self.server.accept()
+            except OSError:
+                break
+            with self.consumers_lock:
+                self.consumers.append(_Consumer(conn, address))
+            print(f"Consumer connected: {address[0]}:{address[1]}")
+
+    def _publish_loop(self):
+        """Encode each capture once and hand it to every consumer"""
+        while True:
+            item = self.publish_queue.get()
+            if item is None:
+                break
+            frame, metadata = item
+
+            with self.consumers_lock:
+                # Drop consumers whose sender thread has given up
+                self.consumers = [consumer for consumer in self.consumers if consumer.alive]
+                consumers = list(self.consumers)
+            if not consumers:
+                continue
+
+            try:
+                message = encode_capture(frame, metadata, self.encoding)
+            except Exception as e:
+                print(f"Failed to encode capture: {e}")
+                continue
+            for consumer in consumers:
+                consumer.offer(message)
+
+    def _archive_loop(self):
+        """Write queued frames to disk"""
+        while True:
+            item = self.archive_queue.get()
+            if item is None:
+                break
+            frame, filename = item
+            try:
+                cv2.imwrite(filename, frame)
+                print(f"Saved image: {os.path.basename(filename)}")
+            except Exception as e:
+                print(f"Failed to save image: {e}")
+            finally:
+                with self.pending_lock:
+                    self.pending.discard(os.path.basename(filename))
+
+    def pending_files(self):
+        """Return the names of files that are queued but not written yet"""
+        with self.pending_lock:
+            return set(self.pending)
+
+    def publish(self, frame, filename, orientation, capture_time=None, extra=None):
+        """Queue a frame for all consumers and the archive without blocking
+
+        capture_time should be when the frame was read from the camera.
+        """
+        self.sequence += 1
+        metadata = {
+            "sequence": self.sequence,
+            "orientation": orientation,
+            "filename": os.path.basename(filename),
+            "capture_time": capture_time if capture_time is not None else time.time(),
+        }
+        if extra:
+            metadata.update(extra)
+        self.publish_queue.put((frame, metadata))
+
+        with self.pending_lock:
+            self.pending.add(os.path.basename(filename))
+        self.archive_queue.put((frame, filename))
+        return metadata
+
+    def close(self):
+        """Stop accepting consumers, then flush the publish and archive queues"""
+        self.running = False
+        self.server.close()
+        self.publish_queue.put(None)
+        self.publish_thread.join()
+        self.archive_queue.put(None)
+        self.archive_thread.join()
+        with self.consumers_lock:
+            consumers = self.consumers
+            self.consumers = []
+        for consumer in consumers:
+            consumer.close()
+
+def run_mock_consumer(host=PUBLISH_HOST, port=PUBLISH_PORT):
+    """Connect to the publisher and report capture-to-consumer latency"""
+    sock = socket.create_connection((host, port))
+    print(f"Mock consumer connected to {host}:{port}")
+    latencies = []
+
+    try:
+        while True:
+            message = receive_capture(sock)
+            if message is None:
+                print("Publisher closed the connection")
+                break
+            frame, metadata = message
+
+            # Publisher and consumer share the same clock on this machine
+            latency_ms = (time.time() - metadata["capture_time"]) * 1000
+            latencies.append(latency_ms)
+            print(f"#{metadata['sequence']} {metadata['filename']} {metadata['orientation']} "
+                  f"{frame.shape[1]}x{frame.shape[0]} {metadata['encoding']}: "
+                  f"latency {latency_ms:.1f} ms (avg {sum(latencies) / len(latencies):.1f} ms)")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sock.close()
+
+if __name__ == "__main__":
+    # Usage: python capture_publisher.py [port]
+    run_mock_consumer(port=int(sys.argv[1]) if len(sys.argv) > 1 else PUBLISH_PORT)
@@ -0,0 +1,82 @@
+import time
+
+# Governor settings
+IDLE_INTERVAL = 0.2  # Seconds between frames while idle (5 fps)
+IDLE_AFTER = 1.0  # Seconds of steady brightness before dropping to the idle rate
+BRIGHTNESS_CHANGE = 0.02  # Bright-ratio change that ramps back to full rate
+IDLE_SAMPLE_STEP = 8  # Only every Nth pixel in each direction is checked while idle
+STATS_INTERVAL = 10.0  # Seconds between CPU usage reports
+
+class FrameRateGovernor:
+    """Lower the polling rate and sampled area while nothing can trigger a capture"""
+
+    def __init__(self):
+        self.idle = False
+        self.baseline = None  # Bright ratio the scene has been steady around
+        self.steady_since = time.time()
+
+        # CPU usage statistics
+        self.stats_wall = time.time()
+        self.stats_cpu = time.process_time()
+        self.stats_frames = 0
+        self.stats_idle_frames = 0
+
+    def sample(self, frame):
+        """Return the part of the frame to run light detection on"""
+        if self.idle:
+            # Sparse grid over the whole frame, a view so nothing is copied
+            return frame[::IDLE_SAMPLE_STEP, ::IDLE_SAMPLE_STEP]
+        return frame
+
+    def update(self, bright_ratio, now, can_idle):
+        """Switch between full and idle rate based on the latest brightness"""
+        self.stats_frames += 1
+        if self.idle:
+            self.stats_idle_frames += 1
+
+        if self.baseline is None:
+            # First frame after a rate change, measured with the current sampling
+            self.baseline = bright_ratio
+        elif abs(bright_ratio - self.baseline) > BRIGHTNESS_CHANGE:
+            # Brightness changed, go back to full rate immediately
+            self.steady_since = now
+            if self.idle:
+                self._set_idle(False)
+                print("Brightness changed, back to full frame rate")
+            else:
+                self.baseline = bright_ratio
+        elif not can_idle:
+            if self.idle:
+                self._set_idle(False)
+                print("Trigger pending, back to full frame rate")
+        elif not self.idle and now - self.steady_since >= IDLE_AFTER:
+            self._set_idle(True)
+            print("Scene idle, dropping to low frame rate")
+
+        self.report(now)
+
+    def _set_idle(self, idle):
+        self.idle = idle
+        # Sampled and full-frame ratios differ slightly, so re-measure the baseline
+        self.baseline = None
+
+    def wait_ms(self):
+        """Milliseconds to pass to cv2.waitKey before the next frame"""
+        return int(IDLE_INTERVAL * 1000) if self.idle else 1
+
+    def report(self, now):
+        """Print CPU usage and frame rate every STATS_INTERVAL seconds"""
+        elapsed = now - self.stats_wall
+        if elapsed < STATS_INTERVAL:
+            return
+
+        cpu = time.process_time()
+        cpu_percent = (cpu - self.stats_cpu) / elapsed * 100
+        idle_share = self.stats_idle_frames / self.stats_frames * 100 if self.stats_frames else 0
+        print(f"CPU: {cpu_percent:.1f}% of one core, {self.stats_frames / elapsed:.1f} fps, "
+              f"{idle_share:.0f}% of frames idle")
+
+        self.stats_wall = now
+        self.stats_cpu = cpu
+        self.stats_frames = 0
+        self.stats_idle_frames = 0